@@ -1,49 +1,97 @@
-import csv
-import logging
 import os
 from datetime import datetime
-from typing import List, Tuple
+from typing import List, Tuple, Dict, Any, Optional
 
 from psycopg2 import sql
-from psycopg2.extensions import connection as PGConnection
 
 from .sql_render import ErrorLoggingCursorParam
-from .pg import get_column_types, build_typed_values_clause
-from .utils import split_schema_table
+from .pg import get_column_types, build_unnest_params, build_in_values_template, build_conditions_sql
+from .utils import split_schema_table, echo
 
 
-def archive_to_csv(rows: List[Tuple], archive_dir: str, table_name: str) -> None:
-    if not rows:
-        return
+def _archive_dir(archive_dir: str) -> str:
     # Create date subdirectory (format: YYMMDD)
     date_subdir = datetime.now().strftime('%y%m%d')
     full_archive_dir = os.path.join(archive_dir, date_subdir)
     os.makedirs(full_archive_dir, exist_ok=True)
-    filename = f"{table_name.replace('.', '_')}_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
-    filepath = os.path.join(full_archive_dir, filename)
-    with open(filepath, mode="w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerows(rows)
-    logging.info(f"[ARCHIVE] {table_name}: Archived {len(rows)} rows to {filepath}")
-    print(f"[ARCHIVE] {table_name}: Archived {len(rows)} rows to {filepath}")
+    return full_archive_dir
 
 
-def select_rows_for_archive(conn: PGConnection, table: str, key_columns: List[str], keys: List[Tuple]) -> List[Tuple]:
+# Size of the write buffer of each archive file
+ARCHIVE_BUFFER_SIZE = 1 << 20
+
+
+def copy_archive_to_csv(cur: ErrorLoggingCursorParam, table: str, key_columns: List[str], keys: List[Tuple],
+                        archive_dir: str, archive_files: Dict[str, List[Any]],
+                        conditions: Optional[List[Dict[str, Any]]] = None, delete: bool = False) -> int:
     """
-    Select rows from a table for archiving based on key columns and values.
+    Stream the rows about to be deleted into the table's archive CSV file with
+    COPY (SELECT ...) TO STDOUT WITH CSV, without materializing them in Python.
+    With delete=True the rows are deleted by the same statement instead
+    (COPY (DELETE ... RETURNING *) ...). Returns the number of rows written.
+
+    key_columns/keys may also be a child's relation columns and parent values, with the
+    relation conditions applied on top.
+
+    archive_files maps table name -> [file, offset where the current batch starts,
+    rows in the current batch]. A file is opened on first use and kept open for the
+    whole run (see close_archive()), so each table gets a single CSV file per run.
     """
     if not keys:
-        return []
+        return 0
     schema, tbl = split_schema_table(table)
-    key_types = get_column_types(conn, schema, tbl, key_columns)
-    vals_sql, vals_params = build_typed_values_clause(keys, key_types)
-
-    with conn.cursor(cursor_factory=ErrorLoggingCursorParam) as cur:
-        cols_sql = sql.SQL(",").join([sql.Identifier(c) for c in key_columns])
-        q = sql.SQL("SELECT * FROM {tbl} WHERE ({cols}) IN (VALUES {vals})").format(
-            tbl=sql.Identifier(schema, tbl),
-            cols=cols_sql,
-            vals=vals_sql,
-        )
-        cur.execute(q, vals_params)
-        return cur.fetchall()
\ No newline at end of file
+    key_types = get_column_types(cur.connection, schema, tbl, key_columns)
+    vals_params = build_unnest_params(keys, len(key_types))
+
+    entry = archive_files.get(table)
+    if entry is None:
+        filename = f"{table.replace('.', '_')}_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
+        f = open(os.path.join(_archive_dir(archive_dir), filename), mode="ab", buffering=ARCHIVE_BUFFER_SIZE)
+        entry = archive_files[table] = [f, f.tell(), 0]
+
+    cond_sql, cond_params = build_conditions_sql(conditions)
+    if delete:
+        delete_sql = build_in_values_template("delete", schema, tbl, tuple(key_columns), tuple(key_types))
+        q = sql.SQL("COPY ({delete}{cond} RETURNING *) TO STDOUT WITH CSV").format(delete=delete_sql, cond=cond_sql)
+    else:
+        select_sql = build_in_values_template("select_all", schema, tbl, tuple(key_columns), tuple(key_types))
+        q = sql.SQL("COPY ({select}{cond}) TO STDOUT WITH CSV").format(select=select_sql, cond=cond_sql)
+    copy_sql = cur.mogrify(q, vals_params + cond_params).decode()
+    cur.copy_expert(copy_sql, entry[0])
+    entry[2] += cur.rowcount
+    return cur.rowcount
+
+
+def publish_archive(archive_files: Dict[str, List[Any]]) -> None:
+    """
+    Keep the rows written by a committed transaction in the archive files.
+    """
+    for table_name, entry in archive_files.items():
+        f, _, rows = entry
+        if not rows:
+            continue
+        f.flush()
+        entry[1], entry[2] = f.tell(), 0
+        echo(f"[ARCHIVE] {table_name}: Archived {rows} rows to {f.name}")
+
+
+def discard_archive(archive_files: Dict[str, List[Any]]) -> None:
+    """
+    Drop the rows written by a rolled back transaction from the archive files.
+    """
+    for entry in archive_files.values():
+        f, batch_start, _ = entry
+        f.flush()
+        f.truncate(batch_start)
+        entry[2] = 0
+
+
+def close_archive(archive_files: Dict[str, List[Any]]) -> None:
+    """
+    Close the archive files of a run. Files that received no rows are removed.
+    """
+    for f, batch_start, _ in archive_files.values():
+        f.close()
+        if not batch_start:
+            os.remove(f.name)
+    archive_files.clear()
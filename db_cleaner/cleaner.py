@@ -1,7 +1,9 @@
 import logging
+import operator
 import os
 import time
 import sys
+from collections import Counter
 from datetime import datetime, timedelta
 from typing import List, Tuple, Dict, Any, Optional, Set
 
@@ -13,98 +15,138 @@ from .sql_render import ErrorLoggingCursorParam
 from .relations import ensure_auto_children, auto_find_fk_relations, normalize_manual_relations, filter_relations, union_relations
 from .pg import (
     get_column_types,
-    build_typed_values_clause,
+    build_unnest_params,
+    build_in_values_template,
     get_primary_key_columns,
     build_conditions_sql,
     fetch_batch,
+    FETCH_ITERSIZE,
+    deallocate_prepared,
+    prefetch_table_metadata,
+    set_statement_timeout,
 )
-from .archive import select_rows_for_archive, archive_to_csv
-from .utils import qualify_table, split_schema_table, format_pg_error, format_duration
+from .archive import copy_archive_to_csv, publish_archive, discard_archive, close_archive
+from .utils import qualify_table, split_schema_table, format_pg_error, format_duration, echo
 
 
-def count_child_matches(conn, child_table: str, mapping: Dict[str, List[str]],
+def count_child_matches(cur, child_table: str, mapping: Dict[str, List[str]],
                         parent_keys: List[Tuple], conditions: Optional[List[Dict[str, Any]]] = None) -> int:
+    if not parent_keys:
+        return 0
     schema, tbl = split_schema_table(child_table)
     child_cols = mapping["child_columns"]
-    child_types = get_column_types(conn, schema, tbl, child_cols)
-    vals_sql, vals_params = build_typed_values_clause(parent_keys, child_types)
-
-    with conn.cursor(cursor_factory=ErrorLoggingCursorParam) as cur:
-        cols_sql = sql.SQL(",").join([sql.Identifier(c) for c in child_cols])
-        base = sql.SQL("SELECT COUNT(*) FROM {tbl} WHERE ({cols}) IN (VALUES {vals})").format(
-            tbl=sql.Identifier(schema, tbl),
-            cols=cols_sql,
-            vals=vals_sql,
-        )
+    child_types = get_column_types(cur.connection, schema, tbl, child_cols)
+    vals_params = build_unnest_params(parent_keys, len(child_types))
+
+    base = build_in_values_template("count", schema, tbl, tuple(child_cols), tuple(child_types))
+    cond_sql, cond_params = build_conditions_sql(conditions)
+    q = base + cond_sql
+    cur.execute(q, vals_params + cond_params)
+    return cur.fetchone()[0]
+
+
+def count_sibling_child_matches(cur,
+                                requests: List[Tuple[str, Dict[str, List[str]], List[Tuple], Optional[List[Dict[str, Any]]]]]) -> List[int]:
+    """
+    Count the matching rows of several sibling child relations in a single round-trip.
+    """
+    if len(requests) == 1:
+        return [count_child_matches(cur, *requests[0])]
+
+    counts = []
+    params: List[Any] = []
+    for child_table, mapping, parent_keys, conditions in requests:
+        schema, tbl = split_schema_table(child_table)
+        child_cols = mapping["child_columns"]
+        child_types = get_column_types(cur.connection, schema, tbl, child_cols)
+        count_sql = build_in_values_template("count", schema, tbl, tuple(child_cols), tuple(child_types))
         cond_sql, cond_params = build_conditions_sql(conditions)
-        q = base + cond_sql
-        cur.execute(q, vals_params + cond_params)
-        return cur.fetchone()[0]
+        counts.append(sql.SQL("(") + count_sql + cond_sql + sql.SQL(")"))
+        params.extend(build_unnest_params(parent_keys, len(child_types)) + cond_params)
 
+    cur.execute(sql.SQL("SELECT ") + sql.SQL(", ").join(counts), params)
+    return list(cur.fetchone())
 
-def select_child_pks(conn, child_table: str, mapping: Dict[str, List[str]],
+
+def select_child_pks(cur, child_table: str, mapping: Dict[str, List[str]],
                      parent_keys: List[Tuple], conditions: Optional[List[Dict[str, Any]]] = None) -> List[Tuple]:
+    if not parent_keys:
+        return []
     schema, tbl = split_schema_table(child_table)
-    pk_cols = get_primary_key_columns(conn, schema, tbl) or mapping["child_columns"]
+    pk_cols = get_primary_key_columns(cur.connection, schema, tbl) or mapping["child_columns"]
     child_cols = mapping["child_columns"]
-    child_types = get_column_types(conn, schema, tbl, child_cols)
-    vals_sql, vals_params = build_typed_values_clause(parent_keys, child_types)
+    child_types = get_column_types(cur.connection, schema, tbl, child_cols)
+    vals_params = build_unnest_params(parent_keys, len(child_types))
+
+    base = build_in_values_template("select", schema, tbl, tuple(child_cols), tuple(child_types), tuple(pk_cols))
+    cond_sql, cond_params = build_conditions_sql(conditions)
+    q = base + cond_sql
+    cur.execute(q, vals_params + cond_params)
+    return cur.fetchall()
+
+
+def select_sibling_child_pks(cur,
+                             requests: List[Tuple[str, Dict[str, List[str]], List[Tuple], Optional[List[Dict[str, Any]]]]]) -> List[List[Tuple]]:
+    """
+    Select child primary keys for several sibling relations in a single round-trip.
+
+    Each sibling becomes one UNION ALL branch tagged with its position. Key values are
+    returned as text, they are cast back to the column type wherever they are bound.
+    """
+    if len(requests) == 1:
+        return [select_child_pks(cur, *requests[0])]
+
+    branches = []
+    params: List[Any] = []
+    for idx, (child_table, mapping, parent_keys, conditions) in enumerate(requests):
+        schema, tbl = split_schema_table(child_table)
+        pk_cols = get_primary_key_columns(cur.connection, schema, tbl) or mapping["child_columns"]
+        child_cols = mapping["child_columns"]
+        child_types = get_column_types(cur.connection, schema, tbl, child_cols)
+        vals_params = build_unnest_params(parent_keys, len(child_types))
 
-    with conn.cursor(cursor_factory=ErrorLoggingCursorParam) as cur:
-        cols_sql = sql.SQL(",").join([sql.Identifier(c) for c in child_cols])
-        pk_sql = sql.SQL(",").join([sql.Identifier(c) for c in pk_cols])
-        base = sql.SQL("SELECT {pk} FROM {tbl} WHERE ({cols}) IN (VALUES {vals})").format(
-            tbl=sql.Identifier(schema, tbl),
-            cols=cols_sql,
-            vals=vals_sql,
-            pk=pk_sql,
-        )
+        branch = build_in_values_template("select_text", schema, tbl, tuple(child_cols), tuple(child_types), tuple(pk_cols))
         cond_sql, cond_params = build_conditions_sql(conditions)
-        q = base + cond_sql
-        cur.execute(q, vals_params + cond_params)
-        return [tuple(r) for r in cur.fetchall()]
-
-
-def delete_child_returning_pk(conn, child_table: str, mapping: Dict[str, List[str]],
-                              parent_keys: List[Tuple], conditions: Optional[List[Dict[str, Any]]] = None) -> List[Tuple]:
-    schema, tbl = split_schema_table(child_table)
-    pk_cols = get_primary_key_columns(conn, schema, tbl) or mapping["child_columns"]
-    child_cols = mapping["child_columns"]
-    child_types = get_column_types(conn, schema, tbl, child_cols)
-    vals_sql, vals_params = build_typed_values_clause(parent_keys, child_types)
-
-    with conn.cursor(cursor_factory=ErrorLoggingCursorParam) as cur:
-        cols_sql = sql.SQL(",").join([sql.Identifier(c) for c in child_cols])
-        pk_sql = sql.SQL(",").join([sql.Identifier(c) for c in pk_cols])
-        base = sql.SQL("DELETE FROM {tbl} WHERE ({cols}) IN (VALUES {vals})").format(
-            tbl=sql.Identifier(schema, tbl),
-            cols=cols_sql,
-            vals=vals_sql,
-        )
+        branches.append(sql.SQL("(") + branch + cond_sql + sql.SQL(")"))
+        params.append(idx)
+        params.extend(vals_params + cond_params)
+
+    results: List[List[Tuple]] = [[] for _ in requests]
+    cur.execute(sql.SQL(" UNION ALL ").join(branches), params)
+    for idx, pk in cur.fetchall():
+        results[idx].append(tuple(pk))
+    return results
+
+
+def delete_rows(cur,
+                requests: List[Tuple[str, Dict[str, List[str]], List[Tuple], Optional[List[Dict[str, Any]]]]]) -> List[int]:
+    """
+    Delete the rows of several tables matching the given values of their child_columns,
+    without selecting their primary keys first. All tables go in one statement, one
+    data-modifying CTE per table. Returns the deleted row count per table.
+    """
+    ctes = []
+    counts = []
+    params: List[Any] = []
+    for idx, (child_table, mapping, parent_keys, conditions) in enumerate(requests):
+        schema, tbl = split_schema_table(child_table)
+        child_cols = mapping["child_columns"]
+        child_types = get_column_types(cur.connection, schema, tbl, child_cols)
+        vals_params = build_unnest_params(parent_keys, len(child_types))
+        name = sql.Identifier(f"d{idx}")
         cond_sql, cond_params = build_conditions_sql(conditions)
-        ret = sql.SQL(" RETURNING {pk}").format(pk=pk_sql)
-        q = base + cond_sql + ret
-        cur.execute(q, vals_params + cond_params)
-        rows = cur.fetchall()
-        print(f"[DELETE] {child_table}: Deleted {len(rows)} rows.")
-        logging.info(f"[DELETE] {child_table}: Deleted {len(rows)} rows.")
-        return [tuple(r) for r in rows]
+        delete_sql = build_in_values_template("delete", schema, tbl, tuple(child_cols), tuple(child_types))
+        ctes.append(sql.SQL("{name} AS ({delete}{cond} RETURNING 1)").format(
+            name=name,
+            delete=delete_sql,
+            cond=cond_sql,
+        ))
+        counts.append(sql.SQL("(SELECT COUNT(*) FROM {})").format(name))
+        params.extend(vals_params + cond_params)
 
-
-def delete_parent(conn, table: str, key_columns: List[str], parent_keys: List[Tuple]) -> int:
-    schema, tbl = split_schema_table(table)
-    key_types = get_column_types(conn, schema, tbl, key_columns)
-    vals_sql, vals_params = build_typed_values_clause(parent_keys, key_types)
-
-    with conn.cursor(cursor_factory=ErrorLoggingCursorParam) as cur:
-        cols_sql = sql.SQL(",").join([sql.Identifier(c) for c in key_columns])
-        q = sql.SQL("DELETE FROM {tbl} WHERE ({cols}) IN (VALUES {vals})").format(
-            tbl=sql.Identifier(schema, tbl),
-            cols=cols_sql,
-            vals=vals_sql,
-        )
-        cur.execute(q, vals_params)
-        return cur.rowcount
+    q = sql.SQL("WITH ") + sql.SQL(", ").join(ctes) + sql.SQL(" SELECT ") + sql.SQL(", ").join(counts)
+    cur.execute(q, params)
+    return list(cur.fetchone())
 
 
 def cascade_delete(conn: PGConnection,
@@ -117,157 +159,200 @@ def cascade_delete(conn: PGConnection,
                    discovered_auto: Set[str],
                    skip_tables: Set[str],
                    skip_columns: Set[str],
-                   edge_path: Optional[Set[Tuple]] = None,
+                   edge_path: Optional[Set[int]] = None,
                    delete_totals: Optional[Dict[str, int]] = None,
                    archive: bool = False,
-                   archive_buffers: Optional[Dict[str, List[Tuple]]] = None) -> None:
-    if edge_path is None:
-        edge_path = set()
+                   archive_path: Optional[str] = None,
+                   archive_files: Optional[Dict[str, List[Any]]] = None,
+                   fk_graph: Optional[Dict[str, List[Tuple]]] = None) -> int:
+    """
+    Delete parent_keys from current_table together with their child rows. Returns the
+    number of rows deleted from current_table (in dry-run, the number of parent_keys).
+
+    The relation tree is walked one depth level at a time, so the child rows of every
+    table on a level are looked up in a single round-trip. Once the whole tree is known,
+    the tables are deleted level by level, deepest first.
+    """
     if delete_totals is None:
         delete_totals = {}
-    if archive_buffers is None:
-        archive_buffers = {}
-
-    if auto_discover and current_table not in discovered_auto:
-        ensure_auto_children(conn, relations_graph, current_table, skip_tables, skip_columns, exclude_cascade=True)
-        discovered_auto.add(current_table)
+    if archive_files is None:
+        archive_files = {}
 
-    # Recursively handle child relationships: First into child table and delete the child table itself
-    for rel in relations_graph.get(current_table, []):
-        child_table = rel["name"]
-        mapping = rel["mapping"]
-        conditions = rel.get("conditions")
-
-        parent_cols = mapping["parent_columns"]
-        child_cols = mapping["child_columns"]
-        edge_key = (current_table, child_table, tuple(parent_cols), tuple(child_cols))
-        if edge_key in edge_path:
-            logging.warning(f"[CYCLE] Infinite loop detected:{current_table} -> {child_table},Skipping...")
-            print(f"[CYCLE] Infinite loop detected:{current_table} -> {child_table}, Skipping...")
-            continue
-        edge_path.add(edge_key)
-
-        # Generate the values of the parent column for matching the child table
-        if set(parent_cols).issubset(set(current_key_columns)):
-            idx = {col: i for i, col in enumerate(current_key_columns)}
-            parent_keys_for_child = [tuple(pk[idx[c]] for c in parent_cols) for pk in parent_keys]
-        else:
-            parent_keys_for_child = fetch_needed_parent_keys(
-                conn=conn,
-                table=current_table,
-                current_key_columns=current_key_columns,
-                parent_keys=parent_keys,
-                needed_columns=parent_cols,
-            )
-            if not parent_keys_for_child:
-                print(f"[WARN] Failed to find the parent column value <{parent_cols}> for the child relation in [{current_table}], skip the child table [{child_table}]")
-                logging.warning(f"[WARN] <{current_table}> is missing the parent column [{parent_cols}] required for the child relationship, skip <{child_table}>")
-                edge_path.remove(edge_key)
+    # One cursor for every statement of the cascade
+    with conn.cursor(cursor_factory=ErrorLoggingCursorParam) as cur:
+        # Tables of the current level: (table, key columns, keys, edges from the root table)
+        level = [(current_table, current_key_columns, parent_keys, frozenset(edge_path or ()))]
+        levels = []
+        while level:
+            levels.append(level)
+
+            # Resolve the parent column values of every relation of the level first, so that
+            # the child lookups can share a single round-trip
+            leaves = []
+            branches = []
+            for table, key_columns, keys, path in level:
+                if auto_discover and table not in discovered_auto:
+                    ensure_auto_children(conn, relations_graph, table, skip_tables, skip_columns, exclude_cascade=True,
+                                         fk_graph=fk_graph)
+                    discovered_auto.add(table)
+
+                for rel in relations_graph.get(table, []):
+                    child_table = rel["name"]
+                    mapping = rel["mapping"]
+
+                    parent_cols = mapping["parent_columns"]
+                    if rel["_edge_id"] in path:
+                        echo(f"[CYCLE] Infinite loop detected:{table} -> {child_table}, Skipping...", logging.WARNING)
+                        continue
+
+                    # Generate the values of the parent column for matching the child table
+                    if parent_cols == key_columns:
+                        parent_keys_for_child = keys
+                    elif set(parent_cols).issubset(set(key_columns)):
+                        getter = operator.itemgetter(*[key_columns.index(c) for c in parent_cols])
+                        if len(parent_cols) > 1:
+                            parent_keys_for_child = [getter(pk) for pk in keys]
+                        else:
+                            parent_keys_for_child = [(getter(pk),) for pk in keys]
+                        # Many parent keys can share the same values: only send each value once
+                        parent_keys_for_child = list(dict.fromkeys(parent_keys_for_child))
+                    else:
+                        parent_keys_for_child = fetch_needed_parent_keys(
+                            cur=cur,
+                            table=table,
+                            current_key_columns=key_columns,
+                            parent_keys=keys,
+                            needed_columns=parent_cols,
+                        )
+                        if not parent_keys_for_child:
+                            print(f"[WARN] Failed to find the parent column value <{parent_cols}> for the child relation in [{table}], skip the child table [{child_table}]")
+                            logging.warning("[WARN] <%s> is missing the parent column [%s] required for the child relationship, skip <%s>",
+                                            table, parent_cols, child_table)
+                            continue
+
+                    if parent_keys_for_child is not keys:
+                        # A NULL parent value never matches a child row (and a nullable FK column is common)
+                        parent_keys_for_child = [k for k in parent_keys_for_child if None not in k]
+                    if not parent_keys_for_child:
+                        # Nothing can match on the child side: skip the round-trip
+                        continue
+
+                    # Children without further relations (leaves) need no primary keys
+                    if auto_discover and child_table not in discovered_auto:
+                        ensure_auto_children(conn, relations_graph, child_table, skip_tables, skip_columns,
+                                             exclude_cascade=True, fk_graph=fk_graph)
+                        discovered_auto.add(child_table)
+                    item = (table, rel, path, parent_keys_for_child)
+                    if relations_graph.get(child_table):
+                        branches.append(item)
+                    else:
+                        leaves.append(item)
+
+            # Leaves are deleted (or counted in dry-run) straight from the parent values, all
+            # leaves of the level in one statement
+            if leaves:
+                requests = [(rel["name"], rel["mapping"], keys, rel.get("conditions")) for _, rel, _, keys in leaves]
+                if dry_run:
+                    for (table, _, _, _), (child_table, _, _, _), cnt in zip(
+                            leaves, requests, count_sibling_child_matches(cur, requests)):
+                        echo(f"[DRY-RUN] Would delete {cnt} rows from {child_table} (child of {table}).")
+                        delete_totals[child_table] = delete_totals.get(child_table, 0) + cnt
+                else:
+                    if archive and archive_path:
+                        # Each table is deleted and archived by a single COPY (DELETE ... RETURNING *)
+                        deleted_counts = [
+                            copy_archive_to_csv(cur, child_table, mapping["child_columns"], keys, archive_path,
+                                                archive_files, conditions, delete=True)
+                            for child_table, mapping, keys, conditions in requests
+                        ]
+                    else:
+                        deleted_counts = delete_rows(cur, requests)
+                    for (table, _, _, _), (child_table, _, _, _), deleted in zip(leaves, requests, deleted_counts):
+                        echo(f"[DELETE] {child_table}: Deleted {deleted} rows (child of {table}).")
+                        delete_totals[child_table] = delete_totals.get(child_table, 0) + deleted
+
+            # The remaining children make up the next level: select their PKs at once
+            sibling_pks = select_sibling_child_pks(
+                cur, [(rel["name"], rel["mapping"], keys, rel.get("conditions")) for _, rel, _, keys in branches]
+            ) if branches else []
+
+            level = []
+            for (table, rel, path, _), child_pks in zip(branches, sibling_pks):
+                child_table = rel["name"]
+                if dry_run:
+                    # The selected keys are exactly the rows that would be deleted: no separate COUNT needed.
+                    # They are added to the totals with the next level.
+                    echo(f"[DRY-RUN] Would delete {len(child_pks)} rows from {child_table} (child of {table}).")
+                if not child_pks:
+                    continue
+                cs, ct = split_schema_table(child_table)
+                child_pk_cols = get_primary_key_columns(conn, cs, ct) or rel["mapping"]["child_columns"]
+                level.append((child_table, child_pk_cols, child_pks, path | {rel["_edge_id"]}))
+
+        # Child rows reference the level above them: delete the deepest level first (or dry run)
+        root_deleted = len(parent_keys)
+        for level in reversed(levels):
+            if dry_run:
+                for table, _, keys, _ in level:
+                    # The keys were just selected in this transaction, so every one of them is an existing row
+                    echo(f"[DRY-RUN] Would delete {len(keys)} rows from {table} (parent).")
+                    delete_totals[table] = delete_totals.get(table, 0) + len(keys)
                 continue
 
-        # Not deleting a child table at the parent level: select child PKs and recurse
-        if dry_run:
-            cnt = count_child_matches(conn, child_table, mapping, parent_keys_for_child, conditions)
-            print(f"[DRY-RUN] Would delete {cnt} rows from {child_table} (child of {current_table}).")
-            logging.info(f"[DRY-RUN] Would delete {cnt} rows from {child_table} (child of {current_table}).")
-            delete_totals[child_table] = delete_totals.get(child_table, 0) + cnt
-            child_pks = select_child_pks(conn, child_table, mapping, parent_keys_for_child, conditions)
-        else:
-            child_pks = select_child_pks(conn, child_table, mapping, parent_keys_for_child, conditions)
-
-        if child_pks:
-            cs, ct = split_schema_table(child_table)
-            child_pk_cols = get_primary_key_columns(conn, cs, ct) or mapping["child_columns"]
-            cascade_delete(
-                conn=conn,
-                current_table=child_table,
-                current_key_columns=child_pk_cols,
-                parent_keys=child_pks,
-                relations_graph=relations_graph,
-                dry_run=dry_run,
-                auto_discover=auto_discover,
-                discovered_auto=discovered_auto,
-                skip_tables=skip_tables,
-                skip_columns=skip_columns,
-                edge_path=edge_path,
-                delete_totals=delete_totals,
-                archive=archive,
-                archive_buffers=archive_buffers,
-            )
-
-        edge_path.remove(edge_key)
-
-    # Delete the current table itself at the end (or dry run)
-    if dry_run:
-        schema, tbl = split_schema_table(current_table)
-        key_types = get_column_types(conn, schema, tbl, current_key_columns)
-        vals_sql, vals_params = build_typed_values_clause(parent_keys, key_types)
-        with conn.cursor(cursor_factory=ErrorLoggingCursorParam) as cur:
-            cols_sql = sql.SQL(",").join([sql.Identifier(c) for c in current_key_columns])
-            q = sql.SQL("SELECT COUNT(*) FROM {tbl} WHERE ({cols}) IN (VALUES {vals})").format(
-                tbl=sql.Identifier(schema, tbl),
-                cols=cols_sql,
-                vals=vals_sql,
-            )
-            cur.execute(q, vals_params)
-            cnt = cur.fetchone()[0]
-        print(f"[DRY-RUN] Would delete {cnt} rows from {current_table} (parent).")
-        logging.info(f"[DRY-RUN] Would delete {cnt} rows from {current_table} (parent).")
-        delete_totals[current_table] = delete_totals.get(current_table, 0) + cnt
-    else:
-        if archive:
-            rows = select_rows_for_archive(conn, current_table, current_key_columns, parent_keys)
-            if rows:
-                archive_buffers.setdefault(current_table, []).extend(rows)
-
-        deleted = delete_parent(conn, current_table, current_key_columns, parent_keys)
-        print(f"[DELETE] {current_table}: Deleted {deleted} rows (parent).")
-        logging.info(f"[DELETE] {current_table}: Deleted {deleted} rows (parent).")
-        delete_totals[current_table] = delete_totals.get(current_table, 0) + deleted
-
-
-def fetch_needed_parent_keys(conn, table: str,
+            if archive and archive_path:
+                # Stream the deleted rows into the archive files
+                deleted_counts = [
+                    copy_archive_to_csv(cur, table, key_columns, keys, archive_path, archive_files, delete=True)
+                    for table, key_columns, keys, _ in level
+                ]
+            else:
+                deleted_counts = delete_rows(
+                    cur, [(table, {"child_columns": key_columns}, keys, None) for table, key_columns, keys, _ in level]
+                )
+            for (table, _, _, _), deleted in zip(level, deleted_counts):
+                echo(f"[DELETE] {table}: Deleted {deleted} rows (parent).")
+                delete_totals[table] = delete_totals.get(table, 0) + deleted
+            if level is levels[0]:
+                # current_table is the only table of the first level
+                root_deleted = deleted_counts[0]
+
+        return root_deleted
+
+
+def fetch_needed_parent_keys(cur, table: str,
                              current_key_columns: List[str],
                              parent_keys: List[Tuple],
                              needed_columns: List[str]) -> List[Tuple]:
+    if not parent_keys:
+        return []
     schema, tbl = split_schema_table(table)
-    key_types = get_column_types(conn, schema, tbl, current_key_columns)
-    vals_sql, vals_params = build_typed_values_clause(parent_keys, key_types)
+    key_types = get_column_types(cur.connection, schema, tbl, current_key_columns)
+    vals_params = build_unnest_params(parent_keys, len(key_types))
 
-    with conn.cursor(cursor_factory=ErrorLoggingCursorParam) as cur:
-        keys_sql = sql.SQL(",").join([sql.Identifier(c) for c in current_key_columns])
-        need_sql = sql.SQL(",").join([sql.Identifier(c) for c in needed_columns])
-        q = sql.SQL(
-            "SELECT {need} FROM {tbl} WHERE ({keys}) IN (VALUES {vals})"
-        ).format(
-            tbl=sql.Identifier(schema, tbl),
-            keys=keys_sql,
-            vals=vals_sql,
-            need=need_sql,
-        )
-        cur.execute(q, vals_params)
-        rows = cur.fetchall()
-        return [tuple(r) for r in rows]
+    # Many parent rows can share the same values: let the server return each value once
+    q = build_in_values_template("select_distinct", schema, tbl, tuple(current_key_columns), tuple(key_types),
+                                 tuple(needed_columns))
+    cur.execute(q, vals_params)
+    return cur.fetchall()
 
 
 def clean_table(conn: PGConnection,
                 conf: Dict[str, Any],
                 skip_tables: Set[str],
                 skip_columns: Set[str],
-                dry_run: bool) -> None:
+                dry_run: bool,
+                fk_graph: Optional[Dict[str, List[Tuple]]] = None) -> None:
     table = qualify_table(conf["name"])
     key_columns: List[str] = conf["key_columns"]
     date_col: str = conf["date_column"]
     time_out: int = conf["time_out"]
     enable: bool = conf.get("enable", True)
     if not enable:
-        logging.warning(f"[SKIP] Table '{table}' skipped due to disabled")
-        print(f"[SKIP] Table '{table}' skipped due to disabled")
+        echo(f"[SKIP] Table '{table}' skipped due to disabled", logging.WARNING)
         return
 
     if conf["name"] in skip_tables or date_col in skip_columns:
-        logging.warning(f"[SKIP] Table '{table}' skipped due to filter rules")
-        print(f"[SKIP] Table '{table}' skipped due to filter rules")
+        echo(f"[SKIP] Table '{table}' skipped due to filter rules", logging.WARNING)
         return
 
     auto_discover = bool(conf.get("auto_discover_related", False))
@@ -279,6 +364,10 @@ def clean_table(conn: PGConnection,
         expire_days = int(conf["expire_days"]) or 45
         
     batch_size = int(conf["batch_size"])
+    # Optional pause between committed batches, to leave room for other load on the database
+    pacing_ms = int(conf.get("pacing_ms", 0) or 0)
+    # Number of batches committed together, fewer commits (WAL flushes) for small batches
+    batches_per_commit = max(1, int(conf.get("batches_per_commit", 1) or 1))
     archive = os.getenv('ARCHIVE')
     if archive is not None:
         archive = archive.lower() in ('true', '1', 'yes', 'on')
@@ -290,13 +379,15 @@ def clean_table(conn: PGConnection,
     
     conditions = conf.get("conditions", []) or []
     disable_cutoff = bool(conf.get("disable_cutoff", False))
+    # Skip a batch that fails with a database error (e.g. a lock or statement timeout) instead of stopping
+    continue_on_error = bool(conf.get("continue_on_error", False))
 
     manual_relations_cfg = conf.get("related", []) or []
     manual_relations = normalize_manual_relations(manual_relations_cfg, main_table=table)
     manual_relations = filter_relations(manual_relations, skip_tables, skip_columns)
 
     exclude_cascade = bool(conf.get("exclude_cascade_fk", True))
-    auto_relations = auto_find_fk_relations(conn, table, exclude_cascade=exclude_cascade) if auto_discover else []
+    auto_relations = auto_find_fk_relations(conn, table, exclude_cascade=exclude_cascade, fk_graph=fk_graph) if auto_discover else []
     auto_relations = filter_relations(auto_relations, skip_tables, skip_columns)
 
     merged = union_relations(manual_relations, auto_relations)
@@ -304,126 +395,185 @@ def clean_table(conn: PGConnection,
     for r in merged:
         relations_graph.setdefault(r["parent_table"], []).append(r)
 
+    # Column types and primary keys of the tables known up front, in one round-trip
+    prefetch_table_metadata(conn, [table] + [r["name"] for r in merged])
+
     cutoff_date = None if disable_cutoff else (datetime.now() - timedelta(days=expire_days)).replace(hour=0, minute=0, second=0, microsecond=0)
     total_deleted = 0
-    run_delete_totals: Dict[str, int] = {}
+    run_delete_totals: Dict[str, int] = Counter()
 
-    logging.info(f"[START] Cleaning table '{table}' " +
-                 (f"with cutoff {cutoff_date} " if cutoff_date else "without default cutoff ") +
-                 (f"and {len(conditions)} parent condition(s)."))
+    logging.info("[START] Cleaning table '%s' %sand %d parent condition(s).", table,
+                 f"with cutoff {cutoff_date} " if cutoff_date else "without default cutoff ", len(conditions))
     print(f"[START] Cleaning table '{table}' " +
           (f"older than {expire_days} days (before {cutoff_date}) " if cutoff_date else "without default cutoff ") +
           (f"with {len(conditions)} extra parent condition(s)."))
 
-    while True:
-        keys = fetch_batch(
-            conn, table, key_columns, date_col, cutoff_date, batch_size, conditions=conditions
-        )
-        if not keys:
-            print(f"[DONE] Table '{table}' cleaned, total deleted: {total_deleted}")
-            logging.info(f"[DONE] Table '{table}' cleaned, total deleted: {total_deleted}")
-            if run_delete_totals and not dry_run:
-                print("[TOTAL] Per-table deletion summary:")
-                for tbl, cnt in run_delete_totals.items():
-                    print(f"  - {tbl}: {cnt} rows.")
-                    logging.info(f"[TOTAL] {tbl}: {cnt} rows.")
-            break
-
-        discovered_auto: Set[str] = set()
+    # The statement timeout is set once for the whole table (session scope) instead of per batch
+    if time_out:
+        set_statement_timeout(conn, f"{time_out}s")
+
+    # Position of the last fetched row, and the statements prepared for the batch query, see fetch_batch()
+    batch_after: Optional[Tuple] = None
+    prepared: Dict[str, str] = {}
+
+    # One archive file per table for the whole run, see copy_archive_to_csv()
+    archive_files: Dict[str, List[Any]] = {}
+    # Rows deleted per table in the current batch, reused across batches
+    batch_delete_totals: Dict[str, int] = {}
+    failed_batches = 0
+    # Batches deleted since the last commit, see batches_per_commit
+    uncommitted_batches = 0
+    uncommitted_parents = 0
+    uncommitted_totals: Dict[str, int] = Counter()
+
+    try:
+        while True:
+            keys, batch_after = fetch_batch(
+                conn, table, key_columns, date_col, cutoff_date, batch_size, conditions=conditions, after=batch_after,
+                stream=batch_size > FETCH_ITERSIZE, prepared=prepared,
+            )
+            if not keys:
+                if uncommitted_batches:
+                    # The last transaction ended on a full batch
+                    conn.commit()
+                    if archive_files:
+                        publish_archive(archive_files)
+                    run_delete_totals.update(uncommitted_totals)
+                echo(f"[DONE] Table '{table}' cleaned, total deleted: {total_deleted}")
+                if failed_batches:
+                    echo(f"[WARN] {table}: {failed_batches} batch(es) rolled back and skipped, "
+                         f"their rows are left for the next run", logging.WARNING)
+                if run_delete_totals and not dry_run:
+                    entries = [f"{tbl}: {cnt} rows." for tbl, cnt in run_delete_totals.items()]
+                    print("[TOTAL] Per-table deletion summary:\n" + "\n".join(f"  - {e}" for e in entries))
+                    logging.info("[TOTAL] %s", " | ".join(entries))
+                break
+
+            discovered_auto: Set[str] = set()
         
-        # Temporarily set statement timeout for this session/transaction
+            if dry_run:
+                echo(f"[DRY-RUN] {table}: Would delete up to {len(keys)} rows in this batch.")
+
+                dry_run_totals: Dict[str, int] = {}
+                cascade_delete(
+                    conn=conn,
+                    current_table=table,
+                    current_key_columns=key_columns,
+                    parent_keys=keys,
+                    relations_graph=relations_graph,
+                    dry_run=True,
+                    auto_discover=auto_discover,
+                    discovered_auto=discovered_auto,
+                    skip_tables=skip_tables,
+                    skip_columns=skip_columns,
+                    delete_totals=dry_run_totals,
+                    fk_graph=fk_graph,
+                )
+                if dry_run_totals:
+                    entries = [f"{tbl}: {cnt} rows." for tbl, cnt in dry_run_totals.items()]
+                    print("[SUMMARY] Dry-run totals (per table):\n" + "\n".join(f" - {e}" for e in entries))
+                    logging.info("[SUMMARY] (dry-run) %s", " | ".join(entries))
+                break
+
+            try:
+                batch_start_time = time.time()
+                batch_delete_totals.clear()
+                uncommitted_batches += 1
+
+                # child -> parent (within a single transaction)
+                deleted_parents = cascade_delete(
+                    conn=conn,
+                    current_table=table,
+                    current_key_columns=key_columns,
+                    parent_keys=keys,
+                    relations_graph=relations_graph,
+                    dry_run=False,
+                    auto_discover=auto_discover,
+                    discovered_auto=discovered_auto,
+                    skip_tables=skip_tables,
+                    skip_columns=skip_columns,
+                    delete_totals=batch_delete_totals,
+                    archive=archive,
+                    archive_path=archive_path,
+                    archive_files=archive_files,
+                    fk_graph=fk_graph,
+                )
+
+                # Keys removed meanwhile (e.g. by an ON DELETE CASCADE) are not counted
+                total_deleted += deleted_parents
+                uncommitted_parents += deleted_parents
+                uncommitted_totals.update(batch_delete_totals)
+
+                # A short batch is the last one: commit it without waiting for batches_per_commit
+                if uncommitted_batches >= batches_per_commit or len(keys) < batch_size:
+                    conn.commit()
+
+                    # keep the archived rows once the transaction is committed
+                    if archive_files:
+                        publish_archive(archive_files)
+
+                    run_delete_totals.update(uncommitted_totals)
+                    uncommitted_totals.clear()
+                    uncommitted_batches = uncommitted_parents = 0
+
+                    # Pause only once the transaction is committed, so no locks are held meanwhile
+                    if pacing_ms > 0:
+                        time.sleep(pacing_ms / 1000)
+
+                batch_end_time = time.time()
+                batch_duration = batch_end_time - batch_start_time
+
+                if batch_delete_totals:
+                    entries = [f"{tbl}: {cnt} rows." for tbl, cnt in batch_delete_totals.items()]
+                    print("[SUMMARY] Per-table deletion in this batch:\n" + "\n".join(f"  - {e}" for e in entries))
+                    logging.info("[SUMMARY] In this batch: %s", " | ".join(entries))
+
+                print(f"[BATCH] {table}: Completed batch of {len(keys)} keys ({deleted_parents} deleted) in {format_duration(batch_duration)}. Total deleted parents: {total_deleted}")
+                logging.info("[BATCH] %s: Completed batch of %d keys (%d deleted) in %s. Total parents: %d",
+                             table, len(keys), deleted_parents, format_duration(batch_duration), total_deleted)
+
+            except psycopg2.Error as e:
+                conn.rollback()
+                discard_archive(archive_files)
+                detail = format_pg_error(e)
+                logging.error("[ERROR] %s psycopg2.Error: %s", table, detail)
+                print(f"[ERROR] Rolled back transaction for '{table}': {detail}")
+                if uncommitted_batches > 1:
+                    # batches_per_commit: the good batches of the same transaction are undone too
+                    echo(f"[WARN] {table}: The rollback also undid {uncommitted_batches - 1} earlier batch(es) "
+                         f"not committed yet ({uncommitted_parents} parent rows)", logging.WARNING)
+                if continue_on_error:
+                    # The rollback only undid the batches since the last commit. The next batch
+                    # continues after their keys, which are left for the next run.
+                    total_deleted -= uncommitted_parents
+                    failed_batches += uncommitted_batches
+                    uncommitted_totals.clear()
+                    uncommitted_batches = uncommitted_parents = 0
+                    continue
+                sys.exit(1)
+                break
+            except Exception as e:
+                conn.rollback()
+                discard_archive(archive_files)
+                logging.error("[ERROR] Transaction rolled back for table '%s': %s", table, e)
+                print(f"[ERROR] Rolled back transaction for '{table}': {e}")
+                sys.exit(1)
+                break
+    finally:
+        # Rows of a transaction that was not committed are not kept
+        discard_archive(archive_files)
+        close_archive(archive_files)
+        # Every batch is either committed or rolled back at this point
+        conn.rollback()
         if time_out:
-            with conn.cursor(cursor_factory=ErrorLoggingCursorParam) as cur:
-                try:
-                    cur.execute("SET LOCAL statement_timeout = %s", (f"{time_out}s",))
-                except Exception:
-                    cur.execute("SET statement_timeout = %s", (f"{time_out}s",))
-                    
-        if dry_run:
-            print(f"[DRY-RUN] {table}: Would delete up to {len(keys)} rows in this batch.")
-            logging.info(f"[DRY-RUN] {table}: Would delete up to {len(keys)} rows in this batch.")
-
-            dry_run_totals: Dict[str, int] = {}
-            cascade_delete(
-                conn=conn,
-                current_table=table,
-                current_key_columns=key_columns,
-                parent_keys=keys,
-                relations_graph=relations_graph,
-                dry_run=True,
-                auto_discover=auto_discover,
-                discovered_auto=discovered_auto,
-                skip_tables=skip_tables,
-                skip_columns=skip_columns,
-                edge_path=set(),
-                delete_totals=dry_run_totals,
-            )
-            if dry_run_totals:
-                print("[SUMMARY] Dry-run totals (per table):")
-                for tbl, cnt in dry_run_totals.items():
-                    print(f" - {tbl}: {cnt} rows.")
-                    logging.info(f"[SUMMARY] (dry-run) {tbl}: {cnt} rows.")
-            break
-
-        try:
-            batch_start_time = time.time()
-            batch_delete_totals: Dict[str, int] = {}
-            archive_buffers: Dict[str, List[Tuple]] = {}
-
-            # child -> parent (within a single transaction)
-            cascade_delete(
-                conn=conn,
-                current_table=table,
-                current_key_columns=key_columns,
-                parent_keys=keys,
-                relations_graph=relations_graph,
-                dry_run=False,
-                auto_discover=auto_discover,
-                discovered_auto=discovered_auto,
-                skip_tables=skip_tables,
-                skip_columns=skip_columns,
-                edge_path=set(),
-                delete_totals=batch_delete_totals,
-                archive=archive,
-                archive_buffers=archive_buffers,
-            )
-
-            conn.commit()
-
-            # archive until transaction is committed
-            if archive and archive_path and archive_buffers:
-                for tbl_name, rows in archive_buffers.items():
-                    if rows:
-                        archive_to_csv(rows, archive_path, tbl_name)
-
-            total_deleted += len(keys)
-            batch_end_time = time.time()
-            batch_duration = batch_end_time - batch_start_time
-
-            if batch_delete_totals:
-                print("[SUMMARY] Per-table deletion in this batch:")
-                for tbl, cnt in batch_delete_totals.items():
-                    print(f"  - {tbl}: {cnt} rows.")
-                    logging.info(f"[SUMMARY] {tbl}: {cnt} rows in this batch.")
-
-                for tbl, cnt in batch_delete_totals.items():
-                    run_delete_totals[tbl] = run_delete_totals.get(tbl, 0) + cnt
-
-            print(f"[BATCH] {table}: Completed batch of {len(keys)} keys in {format_duration(batch_duration)}. Total deleted parents: {total_deleted}")
-            logging.info(f"[BATCH] {table}: Completed batch of {len(keys)} keys in {format_duration(batch_duration)}. Total parents: {total_deleted}")
-
-        except psycopg2.Error as e:
-            conn.rollback()
-            detail = format_pg_error(e)
-            logging.error(f"[ERROR] {table} psycopg2.Error: {detail}")
-            print(f"[ERROR] Rolled back transaction for '{table}': {detail}")
-            sys.exit(1)
-            break
-        except Exception as e:
-            conn.rollback()
-            logging.error(f"[ERROR] Transaction rolled back for table '{table}': {e}")
-            print(f"[ERROR] Rolled back transaction for '{table}': {e}")
-            sys.exit(1)
-            break
-
-        time.sleep(0.2)
\ No newline at end of file
+            try:
+                set_statement_timeout(conn, None)
+            except psycopg2.Error as e:
+                conn.rollback()
+                logging.warning("[WARN] Failed to reset statement_timeout after '%s': %s", table, format_pg_error(e))
+        if prepared:
+            try:
+                deallocate_prepared(conn, prepared)
+            except psycopg2.Error as e:
+                conn.rollback()
+                logging.warning("[WARN] Failed to deallocate prepared statements after '%s': %s", table, format_pg_error(e))
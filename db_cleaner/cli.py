@@ -1,6 +1,7 @@
 import os
 import time
-from typing import Set
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Set, List, Dict, Any
 
 from sqlalchemy import create_engine
 from psycopg2.extensions import connection as PGConnection
@@ -8,6 +9,47 @@ from psycopg2.extensions import connection as PGConnection
 from .config import load_config
 from .utils import setup_logging, format_duration
 from .cleaner import clean_table
+from .relations import load_fk_graph, related_tables
+
+
+def run_table(engine, conf: dict, skip_tables: Set[str], skip_columns: Set[str], dry_run: bool, fk_graph) -> None:
+    table_start_time = time.time()
+    table_name = conf.get("name", "unknown")
+
+    conn: PGConnection = engine.raw_connection()
+    try:
+        clean_table(conn, conf, skip_tables, skip_columns, dry_run, fk_graph=fk_graph)
+    finally:
+        conn.close()
+
+    table_end_time = time.time()
+    table_duration = table_end_time - table_start_time
+    print(f"[TIMING] Table '{table_name}' completed in {format_duration(table_duration)}")
+
+
+def run_tables(engine, confs: List[dict], skip_tables: Set[str], skip_columns: Set[str], dry_run: bool, fk_graph) -> None:
+    for conf in confs:
+        run_table(engine, conf, skip_tables, skip_columns, dry_run, fk_graph)
+
+
+def group_tables(confs: List[dict], fk_graph) -> List[List[dict]]:
+    """
+    Group the table configs that may delete from the same tables (see related_tables()).
+    Groups are independent and can run in parallel, the tables of a group run one after
+    another in config order.
+    """
+    groups: List[Dict[str, Any]] = []
+    for idx, conf in enumerate(confs):
+        group = {"tables": related_tables(conf, fk_graph), "confs": [(idx, conf)]}
+        rest = []
+        for other in groups:
+            if other["tables"].isdisjoint(group["tables"]):
+                rest.append(other)
+            else:
+                group["tables"] |= other["tables"]
+                group["confs"] += other["confs"]
+        groups = rest + [group]
+    return [[conf for _, conf in sorted(g["confs"], key=lambda c: c[0])] for g in groups]
 
 
 def main():
@@ -17,35 +59,57 @@ def main():
     skip_tables: Set[str] = set(cfg.get("skip_tables", []))
     skip_columns: Set[str] = set(cfg.get("skip_columns", []))
     dry_run = bool(cfg.get("dry_run", True))
+    # Top-level tables cleaned concurrently, each on its own connection. Tables whose
+    # relations overlap always run one after another.
+    max_parallel_tables = max(1, int(cfg.get("max_parallel_tables", 1)))
 
     log_file = cfg.get("log_file", "./cleaner.log")
     log_rotate = cfg.get("log_rotate")  # dict or None
     log_console = bool(cfg.get("log_console", True))
-    setup_logging(log_file, rotate=log_rotate, console=log_console)
-
-    print(f"[INFO] Starting database cleanup process...")
-    
-    engine = create_engine(db_uri)
-    conn: PGConnection = engine.raw_connection()
-    overall_start_time = time.time()
+    log_listener = setup_logging(log_file, rotate=log_rotate, console=log_console)
 
+    # Stop the listener whatever happens, so the queued log records are written out
     try:
-        for conf in cfg["tables"]:
-            table_start_time = time.time()
-            table_name = conf.get("name", "unknown")
-            
-            clean_table(conn, conf, skip_tables, skip_columns, dry_run)
-            
-            table_end_time = time.time()
-            table_duration = table_end_time - table_start_time
-            print(f"[TIMING] Table '{table_name}' completed in {format_duration(table_duration)}")
+        print(f"[INFO] Starting database cleanup process...")
+
+        engine = create_engine(db_uri, pool_size=max_parallel_tables, max_overflow=0)
+        overall_start_time = time.time()
+
+        try:
+            # Foreign keys are loaded once for the whole run, auto discovery is then a dict lookup
+            fk_graph = None
+            if any(conf.get("enable", True) and conf.get("auto_discover_related", False) for conf in cfg["tables"]):
+                conn: PGConnection = engine.raw_connection()
+                try:
+                    fk_graph = load_fk_graph(conn)
+                    conn.commit()
+                finally:
+                    conn.close()
+
+            groups = group_tables(cfg["tables"], fk_graph) if max_parallel_tables > 1 else []
+            if len(groups) <= 1:
+                run_tables(engine, cfg["tables"], skip_tables, skip_columns, dry_run, fk_graph)
+            else:
+                with ThreadPoolExecutor(max_workers=min(max_parallel_tables, len(groups))) as ex:
+                    futs = [ex.submit(run_tables, engine, confs, skip_tables, skip_columns, dry_run, fk_graph)
+                            for confs in groups]
+                    for f in as_completed(futs):
+                        try:
+                            f.result()
+                        except BaseException:
+                            # A failed table exits the run: do not start the groups still queued
+                            for other in futs:
+                                other.cancel()
+                            raise
+        finally:
+            engine.dispose()
     finally:
-        conn.close()
-        
+        log_listener.stop()
+
     overall_end_time = time.time()
     overall_duration = overall_end_time - overall_start_time
     print(f"[TIMING] Total cleanup completed in {format_duration(overall_duration)}")
     
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,6 +1,12 @@
 import os
 import yaml
 
+try:
+    # LibYAML-backed loader, much faster than the pure-Python one on large configs
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
 
 def load_config(path: str) -> dict:
     """
@@ -13,7 +19,7 @@ def load_config(path: str) -> dict:
     - ARCHIVE: Whether to archive deleted data to CSV
     """
     with open(path, "r", encoding="utf-8") as f:
-        config = yaml.safe_load(f)
+        config = yaml.load(f, Loader=SafeLoader)
     
     # Override database connection info from environment variables
     # Support two environment variable names for compatibility with existing systems
@@ -1,3 +1,5 @@
+import functools
+import itertools
 from typing import List, Tuple, Dict, Any, Optional
 
 from psycopg2 import sql
@@ -7,69 +9,176 @@ from .sql_render import ErrorLoggingCursorParam
 from .utils import split_schema_table
 
 
-def get_column_types(conn: PGConnection, schema: str, table: str, columns: List[str]) -> List[str]:
-    q = """
-    SELECT a.attname, t.typname
-    FROM pg_attribute a
+# Column types and primary keys do not change during a run, so they are looked up
+# once per table instead of once per batch. See invalidate_schema_cache().
+# (schema, table) -> (column name -> type name, primary key columns)
+_table_metadata_cache: Dict[Tuple[str, str], Tuple[Dict[str, str], List[str]]] = {}
+
+# Column types and primary key position of every column of the given tables, in one query
+_TABLE_METADATA_QUERY = """
+    SELECT n.nspname, c.relname, a.attname, t.typname, array_position(i.indkey, a.attnum)
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
     JOIN pg_type t ON t.oid = a.atttypid
-    WHERE a.attrelid = %s::regclass
-      AND a.attname = ANY(%s)
-      AND a.attnum > 0
+    LEFT JOIN pg_index i ON i.indrelid = c.oid AND i.indisprimary
+    WHERE (n.nspname, c.relname) IN (SELECT * FROM unnest(%s::text[], %s::text[]))
+"""
+
+
+def invalidate_schema_cache() -> None:
+    """
+    Forget all cached column types and primary key columns.
+    """
+    _table_metadata_cache.clear()
+
+
+def prefetch_table_metadata(conn: PGConnection, tables: List[str]) -> None:
     """
-    regclass = f"{schema}.{table}"
+    Load the column types and primary key of several tables (schema.table) in a single
+    round-trip. Tables already cached are skipped.
+    """
+    missing = list(dict.fromkeys(t for t in map(split_schema_table, tables) if t not in _table_metadata_cache))
+    if not missing:
+        return
+    metadata: Dict[Tuple[str, str], Tuple[Dict[str, str], List[Tuple[int, str]]]] = {t: ({}, []) for t in missing}
     with conn.cursor(cursor_factory=ErrorLoggingCursorParam) as cur:
-        cur.execute(q, (regclass, columns))
-        rows = cur.fetchall()
-    typemap = {name: typ for name, typ in rows}
-    return [typemap[c] for c in columns]
+        cur.execute(_TABLE_METADATA_QUERY, build_unnest_params(missing, 2))
+        for schema, table, column, typ, pk_position in cur.fetchall():
+            types, pk = metadata[(schema, table)]
+            types[column] = typ
+            if pk_position is not None:
+                pk.append((pk_position, column))
+    for key, (types, pk) in metadata.items():
+        _table_metadata_cache[key] = (types, [c for _, c in sorted(pk)])
 
 
-def build_typed_values_clause(parent_keys: List[Tuple], col_types: List[str]) -> Tuple[sql.SQL, List[Any]]:
-    if not parent_keys:
-        return sql.SQL(""), []
-    params: List[Any] = []
-    row_templates: List[sql.SQL] = []
-    for tup in parent_keys:
-        if len(tup) != len(col_types):
-            raise ValueError("Each meta-length of parent_keys needs to be consistent with col_types.")
-        cols = []
-        for i, typ in enumerate(col_types):
-            cols.append(sql.SQL("%s::{}").format(sql.SQL(typ)))
-            params.append(tup[i])
-        row_templates.append(sql.SQL("(") + sql.SQL(",").join(cols) + sql.SQL(")"))
-    return sql.SQL(",").join(row_templates), params
+def _get_table_metadata(conn: PGConnection, schema: str, table: str) -> Tuple[Dict[str, str], List[str]]:
+    metadata = _table_metadata_cache.get((schema, table))
+    if metadata is None:
+        prefetch_table_metadata(conn, [f"{schema}.{table}"])
+        metadata = _table_metadata_cache[(schema, table)]
+    return metadata
+
+
+def get_column_types(conn: PGConnection, schema: str, table: str, columns: List[str]) -> List[str]:
+    types = _get_table_metadata(conn, schema, table)[0]
+    return [types[c] for c in columns]
+
+
+def build_unnest_params(keys: List[Tuple], width: int) -> List[Any]:
+    """
+    Transpose a batch of key tuples into one list per column, the parameters of the key
+    clause of build_in_values_template(). One array is bound per key column instead of one
+    parameter per value, so the SQL text stays the same size whatever the batch size is.
+    """
+    if any(len(tup) != width for tup in keys):
+        raise ValueError("Each meta-length of parent_keys needs to be consistent with col_types.")
+    return [list(col) for col in zip(*keys)] if keys else [[] for _ in range(width)]
+
+
+@functools.lru_cache(maxsize=1024)
+def _unnest_sql(col_types: Tuple[str, ...]) -> sql.Composed:
+    arrays = sql.SQL(",").join([sql.SQL("%s::{}[]").format(sql.SQL(typ)) for typ in col_types])
+    return sql.SQL("unnest({})").format(arrays)
+
+
+# Statement heads for build_in_values_template(); {pk} is the projected columns.
+_IN_VALUES_HEADS = {
+    "select": "SELECT {pk} FROM {tbl}",
+    "select_distinct": "SELECT DISTINCT {pk} FROM {tbl}",
+    "select_all": "SELECT * FROM {tbl}",
+    # Tagged with a bound position and key values as text, for UNION ALL over sibling tables
+    "select_text": "SELECT %s, ARRAY[{pk}] FROM {tbl}",
+    "count": "SELECT COUNT(*) FROM {tbl}",
+    "delete": "DELETE FROM {tbl}",
+}
+
+
+@functools.lru_cache(maxsize=1024)
+def build_in_values_template(op: str, schema: str, table: str,
+                             cols: Tuple[str, ...], col_types: Tuple[str, ...],
+                             pk_cols: Tuple[str, ...] = ()) -> sql.Composed:
+    """
+    Compose `<op> ... WHERE (cols) IN (SELECT * FROM unnest(...))` once per table and operation,
+    or `<op> ... WHERE col = ANY(%s::t[])` for a single column.
+
+    Only the parameters change from one batch to the next (see build_unnest_params()),
+    so the statement text is constant and can be appended to (conditions, RETURNING).
+    """
+    if op == "select_text":
+        pk_sql = sql.SQL(",").join([sql.SQL("{}::text").format(sql.Identifier(c)) for c in pk_cols])
+    else:
+        pk_sql = sql.SQL(",").join([sql.Identifier(c) for c in pk_cols])
+    head = sql.SQL(_IN_VALUES_HEADS[op]).format(pk=pk_sql, tbl=sql.Identifier(schema, table))
+    if len(cols) == 1:
+        return head + sql.SQL(" WHERE {col} = ANY(%s::{typ}[])").format(
+            col=sql.Identifier(cols[0]),
+            typ=sql.SQL(col_types[0]),
+        )
+    return head + sql.SQL(" WHERE ({cols}) IN (SELECT * FROM {vals})").format(
+        cols=sql.SQL(",").join([sql.Identifier(c) for c in cols]),
+        vals=_unnest_sql(col_types),
+    )
 
 
 def get_primary_key_columns(conn: PGConnection, schema: str, table: str) -> List[str]:
     """
     Retrieves the primary key column names of a given table in a given schema.
     """
-    q = """
-    SELECT a.attname
-    FROM pg_index i
-    JOIN pg_class c ON c.oid = i.indrelid
-    JOIN pg_namespace n ON n.oid = c.relnamespace
-    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = ANY(i.indkey)
-    WHERE i.indisprimary = TRUE
-      AND n.nspname = %s AND c.relname = %s
-    ORDER BY array_position(i.indkey, a.attnum);
+    return _get_table_metadata(conn, schema, table)[1]
+
+
+def set_statement_timeout(conn: PGConnection, timeout: Optional[str]) -> None:
+    """
+    Set the session statement_timeout, or reset it to the server default when timeout is None.
+    The change is committed right away so that a rolled back batch does not undo it.
     """
     with conn.cursor(cursor_factory=ErrorLoggingCursorParam) as cur:
-        cur.execute(q, (schema, table))
-        return [r[0] for r in cur.fetchall()]
+        if timeout is None:
+            cur.execute("SET statement_timeout = DEFAULT")
+        else:
+            cur.execute("SET statement_timeout = %s", (timeout,))
+    conn.commit()
 
 
-def build_values_clause(cur, tuples: List[Tuple]) -> sql.SQL:
-    parts = []
-    for t in tuples:
-        frag = cur.mogrify("(" + ",".join(["%s"] * len(t)) + ")", t).decode()
-        parts.append(sql.SQL(frag))
-    return sql.SQL(",").join(parts)
+def _array_literal(values) -> str:
+    """
+    Render values as an untyped array literal ('{"a","b"}'), so that PostgreSQL casts it to
+    the array type of the compared column, like the literals of an IN (...) list.
+    """
+    items = []
+    for v in values:
+        if v is None:
+            items.append("NULL")
+        else:
+            items.append('"' + str(v).replace("\\", "\\\\").replace('"', '\\"') + '"')
+    return "{" + ",".join(items) + "}"
+
+
+# id(conditions) -> (conditions, rendered SQL, params). The list itself is kept so that its id
+# cannot be reused by another object.
+_conditions_cache: Dict[int, Tuple[List[Dict[str, Any]], sql.Composable, List[Any]]] = {}
 
 
 def build_conditions_sql(conditions: Optional[List[Dict[str, Any]]]) -> Tuple[sql.SQL, List[Any]]:
+    """
+    Render conditions as " AND ..." with their params.
+
+    Conditions come from the config and are passed again on every batch, so the result is
+    cached per conditions list. The returned params list is shared: do not modify it.
+    """
     if not conditions:
         return sql.SQL(""), []
+    cached = _conditions_cache.get(id(conditions))
+    if cached is not None and cached[0] is conditions:
+        return cached[1], cached[2]
+    cond_sql, params = _render_conditions(conditions)
+    _conditions_cache[id(conditions)] = (conditions, cond_sql, params)
+    return cond_sql, params
+
+
+def _render_conditions(conditions: List[Dict[str, Any]]) -> Tuple[sql.Composable, List[Any]]:
     clauses = []
     params: List[Any] = []
     for cond in conditions:
@@ -82,13 +191,14 @@ def build_conditions_sql(conditions: Optional[List[Dict[str, Any]]]) -> Tuple[sq
         op = cond["op"].upper().strip()
         if op in ("IS NULL", "IS NOT NULL"):
             clauses.append(sql.SQL("{} {}").format(sql.Identifier(col), sql.SQL(op)))
-        elif op == "IN":
+        elif op in ("IN", "NOT IN"):
             vals = cond.get("value", [])
             if not isinstance(vals, (list, tuple)):
-                raise ValueError("conditions.IN expects a list value.")
-            placeholders = sql.SQL(",").join([sql.Placeholder()] * len(vals))
-            clauses.append(sql.SQL("{} IN ({})").format(sql.Identifier(col), placeholders))
-            params.extend(vals)
+                raise ValueError(f"conditions.{op} expects a list value.")
+            # One array parameter whatever the list length, so the SQL text stays the same
+            template = "{} = ANY(%s)" if op == "IN" else "{} <> ALL(%s)"
+            clauses.append(sql.SQL(template).format(sql.Identifier(col)))
+            params.append(_array_literal(vals))
         else:
             clauses.append(sql.SQL("{} {} {}").format(sql.Identifier(col), sql.SQL(op), sql.Placeholder()))
             params.append(cond.get("value"))
@@ -97,36 +207,106 @@ def build_conditions_sql(conditions: Optional[List[Dict[str, Any]]]) -> Tuple[sq
     return sql.SQL(" AND ").join([sql.SQL(""), where_sql]), params
 
 
+_prepared_ids = itertools.count()
+
+
+def execute_prepared(cur, prepared: Dict[str, str], q: sql.Composable, params: List[Any]) -> None:
+    """
+    Run q through a prepared statement, preparing it on first use.
+
+    The %s placeholders of q are numbered ($1, $2, ...) with the same %-rules psycopg2 uses
+    for binding, so the statement text is the prepared statement key.
+    """
+    qtxt = q.as_string(cur.connection) % tuple(f"${i}" for i in range(1, len(params) + 1))
+    name = prepared.get(qtxt)
+    if name is None:
+        name = f"db_cleaner_{next(_prepared_ids)}"
+        cur.execute(sql.SQL("PREPARE {} AS ").format(sql.Identifier(name)) + sql.SQL(qtxt))
+        prepared[qtxt] = name
+    cur.execute(sql.SQL("EXECUTE {} ({})").format(
+        sql.Identifier(name), sql.SQL(",").join([sql.Placeholder()] * len(params))
+    ), params)
+
+
+def deallocate_prepared(conn: PGConnection, prepared: Dict[str, str]) -> None:
+    """
+    Drop the prepared statements created by execute_prepared() on this connection.
+    """
+    with conn.cursor(cursor_factory=ErrorLoggingCursorParam) as cur:
+        for name in prepared.values():
+            cur.execute(sql.SQL("DEALLOCATE {}").format(sql.Identifier(name)))
+    conn.commit()
+    prepared.clear()
+
+
+# Rows per round-trip when fetch_batch streams a batch through a server-side cursor
+FETCH_ITERSIZE = 5000
+
+
 def fetch_batch(conn: PGConnection,
                 table: str,
                 key_columns: List[str],
                 date_column: str,
                 cutoff,                # can be None
                 batch_size: int,
-                conditions: Optional[List[Dict[str, Any]]] = None) -> List[Tuple]:
+                conditions: Optional[List[Dict[str, Any]]] = None,
+                after: Optional[Tuple] = None,
+                stream: bool = False,
+                prepared: Optional[Dict[str, str]] = None) -> Tuple[List[Tuple], Optional[Tuple]]:
+    """
+    Fetch the next batch of keys. Returns (keys, after) where after is the position to
+    pass to the next call.
+
+    The batches are ordered by (date_column, key_columns), or by key_columns alone
+    without a cutoff, and each batch seeks past the last row of the previous one, so the
+    index is not walked again from the start (over the rows already deleted) on every batch.
+
+    With stream, the rows are read through a server-side cursor FETCH_ITERSIZE rows
+    at a time, instead of holding the whole result in the client library while the
+    key tuples are built (for large batch sizes).
+
+    With prepared (statement text -> name, owned by the caller for the connection), the
+    query is PREPAREd on first use and then only EXECUTEd, so it is not parsed and
+    planned again for every batch. See deallocate_prepared(). Conditions with raw_sql are
+    run with a plain execute instead: PREPARE has no bound values to infer the type of their
+    placeholders from (e.g. "%s IS NULL"), where the plain execute sends typed literals.
+    """
     schema, tbl = split_schema_table(table)
-    keys_sql = sql.SQL(",").join([sql.Identifier(c) for c in key_columns])
-    with conn.cursor(cursor_factory=ErrorLoggingCursorParam) as cur:
-        base = sql.SQL("SELECT {keys} FROM {tbl} WHERE TRUE").format(
-            keys=keys_sql, tbl=sql.Identifier(schema, tbl)
-        )
+    order_cols = ([date_column] if cutoff is not None else []) + key_columns
+    order_sql = sql.SQL(",").join([sql.Identifier(c) for c in order_cols])
+    cursor_name = "db_cleaner_fetch_batch" if stream else None
+    with conn.cursor(cursor_name, cursor_factory=ErrorLoggingCursorParam) as cur:
+        if stream:
+            cur.itersize = FETCH_ITERSIZE
         params: List[Any] = []
         if cutoff is not None:
-            base = base + sql.SQL(" AND {} < %s").format(sql.Identifier(date_column))
+            base = sql.SQL("SELECT {order} FROM {tbl} WHERE {date} < %s").format(
+                order=order_sql, tbl=sql.Identifier(schema, tbl), date=sql.Identifier(date_column)
+            )
             params.append(cutoff)
+        else:
+            base = sql.SQL("SELECT {order} FROM {tbl} WHERE TRUE").format(
+                order=order_sql, tbl=sql.Identifier(schema, tbl)
+            )
+        if after is not None:
+            base = base + sql.SQL(" AND ({order}) > ({vals})").format(
+                order=order_sql, vals=sql.SQL(",").join([sql.Placeholder()] * len(after))
+            )
+            params.extend(after)
 
         cond_sql, cond_params = build_conditions_sql(conditions)
-        q = base + cond_sql
-        
-        # Only add ORDER BY if we have a cutoff date (for deterministic batch processing)
-        # Without cutoff, ORDER BY adds unnecessary overhead for large tables
-        if cutoff is not None:
-            q = q + sql.SQL(" ORDER BY {} ASC").format(sql.Identifier(date_column))
-            
-        q = q + sql.SQL(" LIMIT %s")
+        q = base + cond_sql + sql.SQL(" ORDER BY {} ASC LIMIT %s").format(order_sql)
         params.extend(cond_params)
         params.append(batch_size)
 
-        cur.execute(q, params)
-        rows = cur.fetchall()
-    return [tuple(r) for r in rows]
\ No newline at end of file
+        if prepared is not None and not stream and not any("raw_sql" in c for c in conditions or []):
+            execute_prepared(cur, prepared, q, params)
+        else:
+            cur.execute(q, params)
+        # Rows already are tuples with the default cursor class, no copy needed
+        rows = list(cur) if stream else cur.fetchall()
+    if not rows:
+        return [], after
+    if cutoff is None:
+        return rows, rows[-1]
+    return [r[1:] for r in rows], rows[-1]
@@ -1,27 +1,24 @@
-from typing import List, Tuple, Dict, Any, Set
+import itertools
+from typing import List, Tuple, Dict, Any, Set, Optional
 
 from psycopg2 import sql
 from psycopg2.extensions import connection as PGConnection
 
 from .sql_render import ErrorLoggingCursorParam
-from .utils import qualify_table, split_schema_table
+from .utils import qualify_table, split_schema_table, echo
 
 
-def auto_find_fk_relations(conn: PGConnection, parent_qualified: str, exclude_cascade: bool = True) -> List[Dict[str, Any]]:
-    """
-    Find all foreign key relations in a PostgreSQL database that involve a given parent table.
-    
-    Args:
-        conn: Database connection
-        parent_qualified: Parent table name (schema.table)
-        exclude_cascade: If True, exclude foreign keys with CASCADE delete action to avoid redundant processing
-    """
-    parent_schema, parent_table = split_schema_table(parent_qualified)
-    
-    # Query includes confdeltype to identify CASCADE delete actions
-    # confdeltype: 'a' = NO ACTION, 'r' = RESTRICT, 'c' = CASCADE, 'n' = SET NULL, 'd' = SET DEFAULT
-    q = """
+# Every relation entering a relations graph gets an integer "_edge_id", so that
+# cascade_delete can track the edges on its path as a set of ints
+_edge_ids = itertools.count()
+
+
+# Query includes confdeltype to identify CASCADE delete actions
+# confdeltype: 'a' = NO ACTION, 'r' = RESTRICT, 'c' = CASCADE, 'n' = SET NULL, 'd' = SET DEFAULT
+_FK_QUERY = """
     SELECT
+      n_parent.nspname AS parent_schema,
+      c_parent.relname AS parent_table,
       n_child.nspname AS child_schema,
       c_child.relname AS child_table,
       array(
@@ -44,11 +41,66 @@ def auto_find_fk_relations(conn: PGConnection, parent_qualified: str, exclude_ca
       JOIN pg_class c_parent ON c.confrelid = c_parent.oid
       JOIN pg_namespace n_parent ON n_parent.oid = c_parent.relnamespace
     WHERE c.contype = 'f'
-      AND n_parent.nspname = %s AND c_parent.relname = %s;
+"""
+
+
+def load_fk_graph(conn: PGConnection) -> Dict[str, List[Tuple]]:
+    """
+    Load every foreign key of the database in one query.
+
+    Returns parent table (schema.table) -> list of
+    (child_schema, child_table, child_columns, parent_columns, delete_action, constraint_name).
     """
     with conn.cursor(cursor_factory=ErrorLoggingCursorParam) as cur:
-        cur.execute(q, (parent_schema, parent_table))
+        cur.execute(_FK_QUERY)
         rows = cur.fetchall()
+    fk_graph: Dict[str, List[Tuple]] = {}
+    for parent_schema, parent_table, *fk in rows:
+        fk_graph.setdefault(f"{parent_schema}.{parent_table}", []).append(tuple(fk))
+    return fk_graph
+
+
+def related_tables(conf: Dict[str, Any], fk_graph: Optional[Dict[str, List[Tuple]]] = None) -> Set[str]:
+    """
+    Tables a table config may delete from: the table itself, its manual relations and, with
+    auto discovery, every table reachable through foreign keys. This is a superset (skip
+    rules are not applied), used to tell which configs can be cleaned independently.
+    """
+    root = qualify_table(conf["name"])
+    tables = {root}
+    for r in normalize_manual_relations(conf.get("related", []) or [], main_table=root):
+        tables.add(r["name"])
+        tables.add(r["parent_table"])
+    if conf.get("auto_discover_related", False) and fk_graph:
+        todo = list(tables)
+        while todo:
+            for child_schema, child_table, *_ in fk_graph.get(todo.pop(), []):
+                child = f"{child_schema}.{child_table}"
+                if child not in tables:
+                    tables.add(child)
+                    todo.append(child)
+    return tables
+
+
+def auto_find_fk_relations(conn: PGConnection, parent_qualified: str, exclude_cascade: bool = True,
+                           fk_graph: Optional[Dict[str, List[Tuple]]] = None) -> List[Dict[str, Any]]:
+    """
+    Find all foreign key relations in a PostgreSQL database that involve a given parent table.
+    
+    Args:
+        conn: Database connection
+        parent_qualified: Parent table name (schema.table)
+        exclude_cascade: If True, exclude foreign keys with CASCADE delete action to avoid redundant processing
+        fk_graph: Foreign keys preloaded by load_fk_graph(); when given, no query is run
+    """
+    parent_schema, parent_table = split_schema_table(parent_qualified)
+
+    if fk_graph is not None:
+        rows = fk_graph.get(f"{parent_schema}.{parent_table}", [])
+    else:
+        with conn.cursor(cursor_factory=ErrorLoggingCursorParam) as cur:
+            cur.execute(_FK_QUERY + "      AND n_parent.nspname = %s AND c_parent.relname = %s", (parent_schema, parent_table))
+            rows = [tuple(r[2:]) for r in cur.fetchall()]
     
     rels = []
     skipped_cascade = []
@@ -67,6 +119,8 @@ def auto_find_fk_relations(conn: PGConnection, parent_qualified: str, exclude_ca
             
         rels.append({
             "name": child_table_qualified,
+            "_short": child_table,
+            "_key": (f"{parent_schema}.{parent_table}", child_table_qualified, tuple(child_cols), tuple(parent_cols)),
             "parent_table": f"{parent_schema}.{parent_table}",
             "mapping": {
                 "child_columns": list(child_cols),
@@ -76,14 +130,12 @@ def auto_find_fk_relations(conn: PGConnection, parent_qualified: str, exclude_ca
             "constraint_name": constraint_name,
         })
     
-    # Log skipped CASCADE relationships for transparency
+    # Log skipped CASCADE relationships for transparency, as a single message
     if skipped_cascade:
-        import logging
-        print(f"[AUTO-DISCOVER] Skipped {len(skipped_cascade)} tables with CASCADE delete rules:")
-        logging.info(f"[AUTO-DISCOVER] Skipped {len(skipped_cascade)} tables with CASCADE delete rules:")
-        for item in skipped_cascade:
-            print(f"  - {item['table']} (constraint: {item['constraint']})")
-            logging.info(f"  - {item['table']} (constraint: {item['constraint']})")
+        msg = f"[AUTO-DISCOVER] Skipped {len(skipped_cascade)} tables with CASCADE delete rules:\n" + "\n".join(
+            f"  - {item['table']} (constraint: {item['constraint']})" for item in skipped_cascade
+        )
+        echo(msg)
     
     return rels
 
@@ -93,12 +145,15 @@ def normalize_manual_relations(manual: List[Dict[str, Any]], main_table: str) ->
     for r in manual or []:
         rr = dict(r)
         rr["name"] = qualify_table(rr["name"])
+        rr["_short"] = rr["name"].rsplit(".", 1)[-1]
         rr["parent_table"] = qualify_table(rr.get("parent_table") or main_table)
         mp = rr.get("mapping") or {}
         cc = mp.get("child_columns") or []
         pc = mp.get("parent_columns") or []
         if not cc or not pc or len(cc) != len(pc):
             raise ValueError(f"Invalid mapping in relation {rr}")
+        # Identity of the relation, used to merge duplicates (union_relations, ensure_auto_children)
+        rr["_key"] = (rr["parent_table"], rr["name"], tuple(cc), tuple(pc))
         out.append(rr)
     return out
 
@@ -108,14 +163,14 @@ def filter_relations(relations: List[Dict[str, Any]], skip_tables: Set[str], ski
     for t in (skip_tables or []):
         norm_skip_tables.add(t)
         norm_skip_tables.add(qualify_table(t))
+    norm_skip_columns = set(skip_columns or [])
     out = []
     for r in relations:
         child_name = r["name"]
-        child_short = child_name.split(".")[-1]
+        child_short = r.get("_short") or child_name.rsplit(".", 1)[-1]
         if child_name in norm_skip_tables or child_short in norm_skip_tables:
             continue
-        child_cols = r["mapping"]["child_columns"]
-        if any(c in skip_columns for c in child_cols):
+        if not norm_skip_columns.isdisjoint(r["mapping"]["child_columns"]):
             continue
         out.append(r)
     return out
@@ -125,29 +180,26 @@ def union_relations(manual: List[Dict[str, Any]], auto: List[Dict[str, Any]]) ->
     merged = []
     seen = set()
     for r in (manual or []) + (auto or []):
-        key = (r["parent_table"], r["name"],
-               tuple(r["mapping"]["child_columns"]), tuple(r["mapping"]["parent_columns"]))
+        key = r["_key"]
         if key in seen:
             continue
         seen.add(key)
+        r["_edge_id"] = next(_edge_ids)
         merged.append(r)
     return merged
 
 
 def ensure_auto_children(conn: PGConnection, relations_graph: Dict[str, List[Dict[str, Any]]],
-                         table: str, skip_tables, skip_columns, exclude_cascade: bool = True) -> None:
-    auto_rels = auto_find_fk_relations(conn, table, exclude_cascade=exclude_cascade)
+                         table: str, skip_tables, skip_columns, exclude_cascade: bool = True,
+                         fk_graph: Optional[Dict[str, List[Tuple]]] = None) -> None:
+    auto_rels = auto_find_fk_relations(conn, table, exclude_cascade=exclude_cascade, fk_graph=fk_graph)
     auto_rels = filter_relations(auto_rels, skip_tables, skip_columns)
     existing = relations_graph.setdefault(table, [])
-    existing_keys = set(
-        (r["parent_table"], r["name"],
-         tuple(r["mapping"]["child_columns"]), tuple(r["mapping"]["parent_columns"]))
-        for r in existing
-    )
+    existing_keys = {r["_key"] for r in existing}
     for r in auto_rels:
-        key = (r["parent_table"], r["name"],
-               tuple(r["mapping"]["child_columns"]), tuple(r["mapping"]["parent_columns"]))
+        key = r["_key"]
         if key not in existing_keys:
+            r["_edge_id"] = next(_edge_ids)
             existing.append(r)
             existing_keys.add(key)
             
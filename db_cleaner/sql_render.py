@@ -1,27 +1,43 @@
 import logging
 from typing import Any
 
+import psycopg2
 from psycopg2 import sql
 from psycopg2.extensions import cursor as BaseCursor
 
-from .utils import _normalize_casts, _shorten
+from .utils import _normalize_casts, _shorten, echo
 
 
-def _render_sql_with_params(cur, query, vars) -> str:
+# Array parameters (unnest key lists) are cut to this many values in rendered SQL
+_PREVIEW_VALUES = 20
+
+
+def _preview_vars(vars):
+    if isinstance(vars, (list, tuple)):
+        return [v[:_PREVIEW_VALUES] if isinstance(v, list) else v for v in vars]
+    return vars
+
+
+def _render_sql_with_params(cur, query, vars, max_len: int = 2000) -> str:
     """
     Render SQL + params into a final string:
     - For any psycopg2.sql object (SQL/Composed/Identifier), use as_string.
     - Bind params via mogrify; on failure, fall back to raw SQL text.
+    - Only a preview is rendered: list params are cut to their first values, and params
+      are not bound at all when the SQL text alone is longer than max_len.
     - Normalize duplicated casts for cleaner logs.
     """
-    try:
-        qtxt = query.as_string(cur.connection) if hasattr(query, "as_string") else str(query)
-    except Exception:
-        qtxt = str(query)
+    if isinstance(query, str):
+        qtxt = query
+    else:
+        try:
+            qtxt = query.as_string(cur.connection) if hasattr(query, "as_string") else str(query)
+        except Exception:
+            qtxt = str(query)
     final = qtxt
-    if vars is not None:
+    if vars is not None and len(qtxt) <= max_len:
         try:
-            final = cur.mogrify(qtxt, vars).decode()
+            final = cur.mogrify(qtxt, _preview_vars(vars)).decode()
         except Exception:
             final = qtxt
     # Normalize duplicated ::type::type in the rendered SQL
@@ -33,35 +49,25 @@ class ErrorLoggingCursorParam(BaseCursor):
     Cursor that logs the full SQL (with params bound) only when psycopg2.Error occurs.
     """
 
+    # Bound once: execute() runs for every statement, the error path is the rare one
+    _super_execute = BaseCursor.execute
+    _super_executemany = BaseCursor.executemany
+
     def execute(self, query, vars=None):
         try:
-            return super().execute(query, vars)
-        except Exception as e:
-            try:
-                import psycopg2
-                is_pg_error = isinstance(e, psycopg2.Error)
-            except Exception:
-                is_pg_error = True
-            if is_pg_error:
-                full_sql = _render_sql_with_params(self, query, vars)
-                msg = _shorten(full_sql)
-                print(f"[SQL-ERROR] {msg}")
-                logging.error(f"[SQL-ERROR] {msg}")
+            return self._super_execute(query, vars)
+        except psycopg2.Error:
+            full_sql = _render_sql_with_params(self, query, vars)
+            msg = _shorten(full_sql)
+            echo(f"[SQL-ERROR] {msg}", logging.ERROR)
             raise
 
     def executemany(self, query, vars_list):
         try:
-            return super().executemany(query, vars_list)
-        except Exception as e:
-            try:
-                import psycopg2
-                is_pg_error = isinstance(e, psycopg2.Error)
-            except Exception:
-                is_pg_error = True
-            if is_pg_error:
-                first = (vars_list[0] if vars_list else None)
-                full_sql = _render_sql_with_params(self, query, first)
-                msg = _shorten(full_sql)
-                print(f"[SQL-ERROR-MANY] {msg}")
-                logging.error(f"[SQL-ERROR-MANY] {msg}")
+            return self._super_executemany(query, vars_list)
+        except psycopg2.Error:
+            first = (vars_list[0] if vars_list else None)
+            full_sql = _render_sql_with_params(self, query, first)
+            msg = _shorten(full_sql)
+            echo(f"[SQL-ERROR-MANY] {msg}", logging.ERROR)
             raise
\ No newline at end of file
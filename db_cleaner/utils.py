@@ -1,18 +1,24 @@
+import functools
 import logging
 import os
+import queue
 import re
 from typing import Tuple, Optional, Dict, Any
 
 import psycopg2
-from logging.handlers import TimedRotatingFileHandler, RotatingFileHandler
+from logging.handlers import TimedRotatingFileHandler, RotatingFileHandler, QueueHandler, QueueListener
 
 
 def setup_logging(log_file: str,
                   rotate: Optional[Dict[str, Any]] = None,
-                  console: bool = True) -> None:
+                  console: bool = True) -> QueueListener:
     """
     Configure logging with rotation.
 
+    Records are handed to a queue and written by a background thread, so the cleaning
+    threads never wait on the log file. Stop the returned listener before exiting to
+    flush the remaining records.
+
     rotate:
       - Timed rotation (default):
         {"type": "timed", "when": "D", "interval": 1, "backup_count": 7}
@@ -53,28 +59,50 @@ def setup_logging(log_file: str,
         )
 
     handler.setFormatter(fmt)
-    logger.addHandler(handler)
+    handlers = [handler]
 
     if console:
         ch = logging.StreamHandler()
         ch.setFormatter(fmt)
-        logger.addHandler(ch)
+        handlers.append(ch)
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    logger.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, *handlers)
+    listener.start()
+    return listener
+
+
+def echo(msg: str, level: int = logging.INFO) -> None:
+    """
+    Print a message to stdout and write the same text to the log.
+    """
+    print(msg)
+    logging.log(level, msg)
 
 
 def _shorten(text: str, max_len: int = 2000) -> str:
     return (text[:max_len] + "...") if len(text) > max_len else text
 
 
+_DUPLICATE_CAST_RE = re.compile(r"::([A-Za-z0-9_]+)\s*::\1")
+
+
 def _normalize_casts(text: str) -> str:
-    return re.sub(r"::([A-Za-z0-9_]+)\s*::\1", r"::\1", text)
+    if "::" not in text:
+        return text
+    return _DUPLICATE_CAST_RE.sub(r"::\1", text)
 
 
+# Table names are few and resolved on every edge of every batch: cache them
+@functools.lru_cache(maxsize=1024)
 def qualify_table(name: str) -> str:
     if "." in name:
         return name
     return f"public.{name}"
 
 
+@functools.lru_cache(maxsize=1024)
 def split_schema_table(qualified: str) -> Tuple[str, str]:
     if "." in qualified:
         s, t = qualified.split(".", 1)
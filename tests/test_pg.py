@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+from db_cleaner.pg import fetch_batch
+
+# PostgreSQL connection string of a scratch database, e.g. "postgresql://postgres@localhost/postgres"
+DSN = os.environ.get("DB_CLEANER_TEST_DSN")
+
+pytestmark = pytest.mark.skipif(not DSN, reason="DB_CLEANER_TEST_DSN is not set")
+
+TABLE = "pg_temp.fetch_batch_test"
+
+
+@pytest.fixture
+def conn():
+    conn = psycopg2.connect(DSN)
+    with conn.cursor() as cur:
+        cur.execute("CREATE TEMP TABLE fetch_batch_test(k int PRIMARY KEY)")
+        cur.execute("INSERT INTO fetch_batch_test SELECT generate_series(1, 10)")
+    yield conn
+    conn.close()
+
+
+def test_fetch_batch_prepares_plain_conditions(conn):
+    prepared = {}
+    conditions = [{"column": "k", "op": ">", "value": 2}]
+    keys, after = fetch_batch(conn, TABLE, ["k"], "k", None, 3, conditions=conditions, prepared=prepared)
+    assert keys == [(3,), (4,), (5,)]
+    assert len(prepared) == 1
+
+    # The first batch has no keyset position yet: the next ones share a second statement
+    keys, after = fetch_batch(conn, TABLE, ["k"], "k", None, 3, conditions=conditions, after=after, prepared=prepared)
+    assert keys == [(6,), (7,), (8,)]
+    keys, _ = fetch_batch(conn, TABLE, ["k"], "k", None, 3, conditions=conditions, after=after, prepared=prepared)
+    assert keys == [(9,), (10,)]
+    assert len(prepared) == 2
+
+
+def test_fetch_batch_raw_sql_with_untyped_placeholder(conn):
+    # The type of $1 cannot be inferred by PREPARE: the query must run with a plain execute
+    prepared = {}
+    conditions = [{"raw_sql": "(%s IS NULL OR k > 8)", "params": [None]}]
+    keys, _ = fetch_batch(conn, TABLE, ["k"], "k", None, 3, conditions=conditions, prepared=prepared)
+    assert keys == [(1,), (2,), (3,)]
+    assert prepared == {}